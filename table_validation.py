@@ -0,0 +1,759 @@
+"""Validation and archiving utility for the GPHA avian influenza mutation tables.
+
+Takes one or more candidate tables (or a folder of tables), checks each one
+against the YAML schema for its segment, and - if all checks pass - archives
+the current table with a datestamp and installs the new table in its place.
+Every accepted update is recorded in ``updates.log``.
+
+Usage:
+    python table_validation.py new_tables/ --tables-dir . --schemas-dir schemas
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader as _Loader
+
+class _InterningLoader(_Loader):
+    """YAML loader that interns string scalars.
+
+    The per-segment schemas repeat the same column names, type names and
+    allowed values many times over; interning makes every copy share one
+    object instead of each schema holding its own.
+    """
+
+    def construct_scalar(self, node):
+        value = super().construct_scalar(node)
+        if isinstance(value, str):
+            return sys.intern(value)
+        return value
+
+
+_YAML_LOADER = _InterningLoader
+
+try:
+    import pyarrow  # noqa: F401  (string[pyarrow] halves per-value overhead)
+    _HAVE_PYARROW = True
+    _STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    _HAVE_PYARROW = False
+    _STRING_DTYPE = "string"
+
+try:
+    import orjson
+
+    def _dump_json_line(entry):
+        return orjson.dumps(entry).decode()
+except ImportError:
+    def _dump_json_line(entry):
+        return json.dumps(entry)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_allowed_file(path):
+    """Read an allowed-values file into a frozenset, once per path."""
+    with open(path) as vf:
+        return frozenset(line.strip() for line in vf if line.strip())
+
+
+@functools.lru_cache(maxsize=None)
+def _load_ref_values(ref_path, ref_col, mtime):
+    """Deduplicated values of a foreign-key reference column, cached per
+    (path, column, mtime)."""
+    return read_table(ref_path)[ref_col].drop_duplicates()
+
+
+def _pk_duplicate_count(df, pk):
+    """Count rows taking part in duplicated primary-key tuples.
+
+    Hashes the key columns with hash_pandas_object and counts repeats via
+    np.unique - faster than DataFrame.duplicated for composite keys, and
+    the same mechanism the streaming path uses across chunks.
+    """
+    hashes = pd.util.hash_pandas_object(df[pk], index=False).to_numpy()
+    _, counts = np.unique(hashes, return_counts=True)
+    return int(counts[counts > 1].sum())
+
+
+def _col_err(name, rest):
+    """Build a column error message around an interned per-column prefix.
+
+    Large batches emit the same ``column '<name>': `` prefix over and over;
+    interning it keeps one copy alive instead of reallocating per message.
+    """
+    return sys.intern(f"column '{name}': ") + rest
+
+
+# codegen'd validators live here rather than on the schema dicts so the
+# dicts stay picklable for the worker pool; forked workers inherit the map
+_VALIDATORS = {}
+
+
+def _compile_validator(schema_name, schema):
+    """Generate a validator function specialised to one schema.
+
+    Emits Python source containing only the checks this schema's columns
+    actually use (no rule dispatch, no dict lookups in the hot path),
+    exec's it, and returns the resulting ``_validator(df, tables_dir)``.
+    The error messages match the generic interpreter exactly.
+    """
+    env = {
+        "pd": pd,
+        "Path": Path,
+        "_type_check": _type_check,
+        "_load_ref_values": _load_ref_values,
+        "_STRING_DTYPE": _STRING_DTYPE,
+        "_EXPECTED": [col["name"] for col in schema.get("columns", [])],
+    }
+    lines = [
+        "def _validator(df, tables_dir=None):",
+        "    errors = []",
+        "    missing = [c for c in _EXPECTED if c not in df.columns]",
+        "    if missing:",
+        "        errors.append('missing required columns: ' + ', '.join(missing))",
+    ]
+    if schema.get("strict_columns", True):
+        env["_EXPECTED_SET"] = set(env["_EXPECTED"])
+        lines += [
+            "    unexpected = [c for c in df.columns if c not in _EXPECTED_SET]",
+            "    if unexpected:",
+            "        errors.append('unexpected columns: ' + ', '.join(unexpected))",
+        ]
+    if schema.get("fail_fast", True):
+        lines += [
+            "    if errors:",
+            "        return errors",
+        ]
+
+    for i, col_rule in enumerate(schema.get("columns", [])):
+        checks = []
+
+        def emit(text, indent=8):
+            checks.append(" " * indent + text)
+
+        name_var = f"_NAME{i}"
+        env[name_var] = col_rule["name"]
+        prefix_var = f"_PREFIX{i}"
+        env[prefix_var] = sys.intern(f"column '{col_rule['name']}': ")
+
+        if col_rule.get("not_null"):
+            emit("null_rows = list(series.index[series.isna()])")
+            emit("if null_rows:")
+            emit(f"    errors.append({prefix_var} + f\"{{len(null_rows)}} "
+                 "empty values (rows {null_rows[:5]}...)\")")
+
+        needs_numeric = (
+            col_rule.get("type") in ("int", "float")
+            or "min" in col_rule or "max" in col_rule
+        )
+        if needs_numeric:
+            emit("numeric = pd.to_numeric(series, errors='coerce')")
+
+        if "type" in col_rule:
+            env[f"_TYPE{i}"] = col_rule["type"]
+            extra = ", coerced=numeric" if needs_numeric else ""
+            if col_rule["type"] == "date":
+                env[f"_DATEFMT{i}"] = col_rule.get("format")
+                extra += f", date_format=_DATEFMT{i}"
+            emit(f"bad_rows = _type_check(series, _TYPE{i}{extra})")
+            emit("if bad_rows:")
+            emit(f"    errors.append({prefix_var} + f\"{{len(bad_rows)}} "
+                 f"values are not of type '{{_TYPE{i}}}' (rows {{bad_rows[:5]}}...)\")")
+
+        if "pattern" in col_rule:
+            env[f"_PATTERN{i}"] = col_rule["pattern"]
+            emit(f"ok = series.astype(_STRING_DTYPE).str.match(_PATTERN{i}, na=True)")
+            emit("bad_rows = list(series.index[~ok.to_numpy(dtype=bool)])")
+            emit("if bad_rows:")
+            emit(f"    errors.append({prefix_var} + f\"{{len(bad_rows)}} "
+                 f"values do not match pattern '{{_PATTERN{i}}}' (rows {{bad_rows[:5]}}...)\")")
+
+        if "allowed_values" in col_rule:
+            env[f"_ALLOWED{i}"] = frozenset(str(v) for v in col_rule["allowed_values"])
+            emit(f"mask = series.notna() & ~series.astype(str).isin(_ALLOWED{i})")
+            emit("bad_rows = list(series.index[mask])")
+            emit("if bad_rows:")
+            emit(f"    errors.append({prefix_var} + f\"{{len(bad_rows)}} "
+                 "values outside the allowed set (rows {bad_rows[:5]}...)\")")
+
+        if "allowed_values_file" in col_rule:
+            env[f"_AFILE{i}"] = col_rule["allowed_values_file"]
+            env[f"_AFILE_SET{i}"] = _load_allowed_file(col_rule["allowed_values_file"])
+            emit(f"mask = series.notna() & ~series.astype(str).isin(_AFILE_SET{i})")
+            emit("bad_rows = list(series.index[mask])")
+            emit("if bad_rows:")
+            emit(f"    errors.append({prefix_var} + f\"{{len(bad_rows)}} "
+                 f"values not in {{_AFILE{i}}} (rows {{bad_rows[:5]}}...)\")")
+
+        if "min" in col_rule:
+            env[f"_MIN{i}"] = col_rule["min"]
+            emit(f"below = numeric[numeric < _MIN{i}]")
+            emit("if len(below):")
+            emit(f"    errors.append({prefix_var} + f\"{{len(below)}} "
+                 f"values below minimum {{_MIN{i}}}\")")
+        if "max" in col_rule:
+            env[f"_MAX{i}"] = col_rule["max"]
+            emit(f"above = numeric[numeric > _MAX{i}]")
+            emit("if len(above):")
+            emit(f"    errors.append({prefix_var} + f\"{{len(above)}} "
+                 f"values above maximum {{_MAX{i}}}\")")
+
+        if "foreign_key" in col_rule:
+            env[f"_FK_TABLE{i}"] = col_rule["foreign_key"]["table"]
+            env[f"_FK_COL{i}"] = col_rule["foreign_key"]["column"]
+            emit("if tables_dir is not None:")
+            emit(f"    ref_path = Path(tables_dir) / _FK_TABLE{i}")
+            emit("    if ref_path.exists():")
+            emit(f"        ref_values = _load_ref_values(str(ref_path), _FK_COL{i}, "
+                 "ref_path.stat().st_mtime)")
+            emit("        mask = series.notna() & ~series.isin(ref_values)")
+            emit("        if mask.any():")
+            emit(f"            errors.append({prefix_var} + f\"{{int(mask.sum())}} "
+                 f"values not present in {{_FK_TABLE{i}}}.{{_FK_COL{i}}}\")")
+            emit("    else:")
+            emit(f"        errors.append({prefix_var} + f\"reference table {{ref_path}} not found\")")
+
+        if checks:
+            lines.append(f"    if {name_var} in df.columns:")
+            lines.append(f"        series = df[{name_var}]")
+            lines.extend(checks)
+
+    pk = schema.get("primary_key")
+    if pk:
+        env["_PK"] = pk
+        env["_pk_duplicate_count"] = _pk_duplicate_count
+        lines += [
+            "    if all(c in df.columns for c in _PK):",
+            "        dup_count = _pk_duplicate_count(df, _PK)",
+            "        if dup_count:",
+            "            errors.append(f'primary key {_PK} has {dup_count} duplicated rows')",
+        ]
+
+    lines.append("    return errors")
+    exec(compile("\n".join(lines), f"<validator:{schema_name}>", "exec"), env)
+    return env["_validator"]
+
+
+def load_schemas(schema_dir):
+    """Load every YAML schema in ``schema_dir``, keyed by file stem.
+
+    Rules that would otherwise be rebuilt for every validated file are
+    compiled once here and attached to the column under private keys:
+    ``_pattern_re`` (compiled regex), ``_allowed_set`` and
+    ``_allowed_file_set`` (frozensets of permitted values). Each schema
+    also gets a code-generated validator (see _compile_validator),
+    registered in _VALIDATORS under the schema's key.
+    """
+    schemas = {}
+    for path in sorted(Path(schema_dir).glob("*.yaml")):
+        with open(path, "rb") as f:
+            schema = yaml.load(f.read(), Loader=_YAML_LOADER)
+        for col in schema.get("columns", []):
+            if "pattern" in col:
+                col["_pattern_re"] = re.compile(col["pattern"])
+            if "allowed_values" in col:
+                col["_allowed_set"] = frozenset(str(v) for v in col["allowed_values"])
+            if "allowed_values_file" in col:
+                # resolve relative to the schema's own directory
+                col["allowed_values_file"] = str(
+                    (path.parent / col["allowed_values_file"]).resolve()
+                )
+                col["_allowed_file_set"] = _load_allowed_file(col["allowed_values_file"])
+        _VALIDATORS[path.stem] = _compile_validator(path.stem, schema)
+        schema["_validator"] = path.stem
+        schemas[path.stem] = schema
+    return schemas
+
+
+def build_schema_prefix_map(schemas):
+    """Map each schema's segment prefix ('ha', 'pb2', ...) to its schema."""
+    return {key.split("_", 1)[0]: schema for key, schema in schemas.items()}
+
+
+def find_schema_for_file(schemas_by_prefix, file_path):
+    """Return the schema matching ``file_path``'s segment prefix, else None."""
+    return schemas_by_prefix.get(Path(file_path).name.split("_", 1)[0])
+
+
+def read_table(path, use_arrow=True):
+    """Read a candidate table into a DataFrame, inferring the delimiter.
+
+    When pyarrow is importable (and ``use_arrow`` is left on), CSV/TSV
+    parsing goes through the multithreaded Arrow engine, which is several
+    times faster than the default parser on non-tiny tables.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".xls":
+        print(f"WARNING: {path.name}: legacy .xls is slow to parse; prefer csv/tsv")
+        return pd.read_excel(path)
+    if suffix == ".xlsx":
+        try:
+            import openpyxl
+        except ImportError:
+            return pd.read_excel(path)
+        # read_only mode streams rows without materialising the whole sheet
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            return pd.DataFrame.from_records(rows, columns=header)
+        finally:
+            wb.close()
+    sep = "\t" if suffix in (".tsv", ".tab") else ","
+    if use_arrow and _HAVE_PYARROW:
+        return pd.read_csv(
+            path, sep=sep, dtype=str, engine="pyarrow", dtype_backend="pyarrow"
+        )
+    return pd.read_csv(path, sep=sep, dtype=str)
+
+
+def _type_check(series, expected_type, coerced=None, date_format=None):
+    """Return the row indices of values that do not parse as ``expected_type``.
+
+    ``coerced`` lets the caller pass an already-coerced numeric view of the
+    column so int/float checks don't repeat the conversion. ``date_format``
+    is an optional strptime pattern from the schema; when given, date
+    parsing uses C-level strptime instead of per-element format inference.
+    """
+    if expected_type in ("int", "float"):
+        if coerced is None:
+            coerced = pd.to_numeric(series, errors="coerce")
+        mask = series.notna() & coerced.isna()
+        if expected_type == "int":
+            mask |= coerced.notna() & (coerced % 1 != 0)
+        return list(series.index[mask])
+    if expected_type == "date":
+        # cache=True memoises parsing of repeated date strings
+        parsed = pd.to_datetime(
+            series, format=date_format, utc=True, errors="coerce", cache=True
+        )
+        return list(series.index[series.notna() & parsed.isna()])
+    return []
+
+
+def validate_dataframe(df, schema, tables_dir=None):
+    """Check ``df`` against ``schema`` and return a list of error messages.
+
+    Schemas that came through load_schemas dispatch to their specialised
+    code-generated validator; hand-built schema dicts fall back to the
+    generic interpreter.
+    """
+    validator = _VALIDATORS.get(schema.get("_validator"))
+    if validator is not None:
+        return validator(df, tables_dir)
+    return _validate_dataframe_generic(df, schema, tables_dir)
+
+
+def _validate_dataframe_generic(df, schema, tables_dir=None):
+    """Interpret ``schema``'s rules directly; the template for the codegen."""
+    errors = []
+
+    expected = [col["name"] for col in schema.get("columns", [])]
+    missing = [c for c in expected if c not in df.columns]
+    if missing:
+        errors.append(f"missing required columns: {', '.join(missing)}")
+    if schema.get("strict_columns", True):
+        unexpected = [c for c in df.columns if c not in expected]
+        if unexpected:
+            errors.append(f"unexpected columns: {', '.join(unexpected)}")
+    if errors and schema.get("fail_fast", True):
+        # structurally wrong file; don't pay for the per-column scans
+        return errors
+
+    for col_rule in schema.get("columns", []):
+        name = col_rule["name"]
+        if name not in df.columns:
+            continue
+        series = df[name]
+
+        if col_rule.get("not_null"):
+            null_rows = list(series.index[series.isna()])
+            if null_rows:
+                errors.append(_col_err(
+                    name, f"{len(null_rows)} empty values (rows {null_rows[:5]}...)"
+                ))
+
+        # one numeric coercion per column, shared by the type and range checks
+        numeric = None
+        if col_rule.get("type") in ("int", "float") or "min" in col_rule or "max" in col_rule:
+            numeric = pd.to_numeric(series, errors="coerce")
+
+        if "type" in col_rule:
+            bad_rows = _type_check(
+                series, col_rule["type"], coerced=numeric,
+                date_format=col_rule.get("format"),
+            )
+            if bad_rows:
+                errors.append(_col_err(
+                    name,
+                    f"{len(bad_rows)} values are not of type "
+                    f"'{col_rule['type']}' (rows {bad_rows[:5]}...)",
+                ))
+
+        if "pattern" in col_rule:
+            reg = col_rule.get("_pattern_re") or re.compile(col_rule["pattern"])
+            ok = series.astype(_STRING_DTYPE).str.match(reg.pattern, na=True)
+            bad_rows = list(series.index[~ok.to_numpy(dtype=bool)])
+            if bad_rows:
+                errors.append(_col_err(
+                    name,
+                    f"{len(bad_rows)} values do not match "
+                    f"pattern '{col_rule['pattern']}' (rows {bad_rows[:5]}...)",
+                ))
+
+        if "allowed_values" in col_rule:
+            allowed = col_rule.get("_allowed_set") or frozenset(
+                str(v) for v in col_rule["allowed_values"]
+            )
+            mask = series.notna() & ~series.astype(str).isin(allowed)
+            bad_rows = list(series.index[mask])
+            if bad_rows:
+                errors.append(_col_err(
+                    name,
+                    f"{len(bad_rows)} values outside the "
+                    f"allowed set (rows {bad_rows[:5]}...)",
+                ))
+
+        if "allowed_values_file" in col_rule:
+            values_path = col_rule["allowed_values_file"]
+            allowed = col_rule.get("_allowed_file_set") or _load_allowed_file(values_path)
+            mask = series.notna() & ~series.astype(str).isin(allowed)
+            bad_rows = list(series.index[mask])
+            if bad_rows:
+                errors.append(_col_err(
+                    name,
+                    f"{len(bad_rows)} values not in "
+                    f"{values_path} (rows {bad_rows[:5]}...)",
+                ))
+
+        if "min" in col_rule:
+            lo = col_rule["min"]
+            below = numeric[numeric < lo]
+            if len(below):
+                errors.append(_col_err(name, f"{len(below)} values below minimum {lo}"))
+        if "max" in col_rule:
+            hi = col_rule["max"]
+            above = numeric[numeric > hi]
+            if len(above):
+                errors.append(_col_err(name, f"{len(above)} values above maximum {hi}"))
+
+        if "foreign_key" in col_rule and tables_dir is not None:
+            fk = col_rule["foreign_key"]
+            ref_path = Path(tables_dir) / fk["table"]
+            if ref_path.exists():
+                # keep both sides in their native dtype; isin hashes in C
+                ref_values = _load_ref_values(
+                    str(ref_path), fk["column"], ref_path.stat().st_mtime
+                )
+                mask = series.notna() & ~series.isin(ref_values)
+                if mask.any():
+                    errors.append(_col_err(
+                        name,
+                        f"{int(mask.sum())} values not present in "
+                        f"{fk['table']}.{fk['column']}",
+                    ))
+            else:
+                errors.append(_col_err(name, f"reference table {ref_path} not found"))
+
+    pk = schema.get("primary_key")
+    if pk and all(c in df.columns for c in pk):
+        dup_count = _pk_duplicate_count(df, pk)
+        if dup_count:
+            errors.append(f"primary key {pk} has {dup_count} duplicated rows")
+
+    return errors
+
+
+def validate_dataframe_streaming(path, schema, tables_dir=None, chunksize=200_000):
+    """Validate a CSV/TSV in chunks and return ``(errors, n_rows)``.
+
+    Runs the same column rules as validate_dataframe one chunk at a time,
+    so peak memory stays at O(chunksize) rather than O(table). Primary-key
+    uniqueness is tracked across chunks with a running set of row hashes.
+    Excel files cannot be read in chunks and fall back to the in-memory path.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".xls"):
+        df = read_table(path)
+        return validate_dataframe(df, schema, tables_dir=tables_dir), len(df)
+
+    # the primary key has to be checked across chunks, not per chunk, so
+    # drop it (and the codegen'd validator, which embeds it) per chunk
+    chunk_schema = {
+        k: v for k, v in schema.items() if k not in ("primary_key", "_validator")
+    }
+    pk = schema.get("primary_key")
+
+    errors = []
+    seen_hashes = set()
+    dup_rows = 0
+    n_rows = 0
+    sep = "\t" if suffix in (".tsv", ".tab") else ","
+    for chunk in pd.read_csv(path, sep=sep, dtype=str, chunksize=chunksize):
+        errors.extend(validate_dataframe(chunk, chunk_schema, tables_dir=tables_dir))
+        n_rows += len(chunk)
+        if pk and all(c in chunk.columns for c in pk):
+            hashes = pd.util.hash_pandas_object(chunk[pk], index=False).to_numpy()
+            dup_mask = pd.Series(hashes).duplicated(keep=False).to_numpy()
+            if seen_hashes:
+                dup_mask = dup_mask | np.isin(
+                    hashes, np.fromiter(seen_hashes, dtype=np.uint64)
+                )
+            dup_rows += int(dup_mask.sum())
+            seen_hashes.update(hashes.tolist())
+    if dup_rows:
+        errors.append(f"primary key {pk} has {dup_rows} duplicated rows")
+
+    # structural errors (missing/unexpected columns) repeat per chunk
+    return list(dict.fromkeys(errors)), n_rows
+
+
+_TABLE_SUFFIXES = frozenset({".csv", ".tsv", ".tab", ".xlsx", ".xls"})
+
+
+def list_candidate_files(input_dir):
+    """Yield paths of table files under ``input_dir``, skipping hidden dirs.
+
+    Built on os.scandir so each directory entry is stat'ed once, and lazy
+    so validation can start before a large upload tree is fully walked.
+    """
+    stack = [os.fspath(input_dir)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        stack.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in _TABLE_SUFFIXES:
+                    yield entry.path
+
+
+def hash_and_count(path):
+    """Return ``(sha256_hex, data_rows)`` from a single pass over the file.
+
+    The file is read once; the digest and the newline count are then both
+    C-level scans over the same in-memory buffer.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    lines = data.count(b"\n")
+    return digest, max(lines - 1, 0)  # discount the header
+
+
+def _drop_shadowed_excel(files):
+    """Drop Excel files whose CSV/TSV twin is in the same candidate batch.
+
+    Excel parsing is an order of magnitude slower than CSV and cannot be
+    chunked, so when the same table was uploaded in both formats only the
+    text one is validated.
+    """
+    text_stems = {
+        os.path.splitext(f)[0] for f in files
+        if os.path.splitext(f)[1].lower() in (".csv", ".tsv", ".tab")
+    }
+    kept = []
+    for f in files:
+        stem, suffix = os.path.splitext(f)
+        if suffix.lower() in (".xlsx", ".xls") and stem in text_stems:
+            print(f"Skipping {f}: csv/tsv version of the same table found")
+        else:
+            kept.append(f)
+    return kept
+
+
+def utc_now_iso():
+    """Current UTC time as an ISO-8601 string."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _fast_copy(src, dst):
+    """Copy file data and metadata, letting the kernel move the bytes.
+
+    shutil.copyfile routes through sendfile/copy_file_range on Linux;
+    copying the metadata separately keeps copy2's behaviour without
+    blocking that fast path.
+    """
+    shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+def _fast_move(src, dst):
+    """Rename atomically when possible, falling back to copy-and-delete."""
+    try:
+        os.rename(src, dst)
+    except OSError:  # cross-filesystem move
+        shutil.move(src, dst)
+
+
+def append_log_entries(log_file, entries):
+    """Append one JSON line per update entry to the log in a single write."""
+    if not entries:
+        return
+    lines = [_dump_json_line(entry) + "\n" for entry in entries]
+    with open(log_file, "a", buffering=1 << 16) as lf:
+        lf.writelines(lines)
+
+
+def archive_and_replace(src_path, target_path, archive_dir, new_rows=None):
+    """Archive the current table with a datestamp and install ``src_path``.
+
+    Returns the update-log entry for the replacement; the caller batches
+    entries and appends them with append_log_entries. ``new_rows`` lets the
+    caller pass the row count from the validation pass, which already
+    parsed the table, instead of re-reading it here.
+    """
+    src_path = Path(src_path)
+    target_path = Path(target_path)
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    datestamp = datetime.now(timezone.utc).strftime("%Y%m%d")
+    new_sha, new_count = hash_and_count(src_path)
+    entry = {
+        "timestamp": utc_now_iso(),
+        "table": target_path.name,
+        "new_sha256": new_sha,
+        "new_rows": new_rows if new_rows is not None else new_count,
+    }
+
+    if target_path.exists():
+        archived_path = archive_dir / f"{datestamp}_{target_path.name}"
+        entry["old_sha256"], entry["old_rows"] = hash_and_count(target_path)
+        entry["archived_as"] = archived_path.name
+        _fast_copy(target_path, archived_path)
+
+    _fast_move(str(src_path), str(target_path))
+
+    return entry
+
+
+def _validate_one(path, schema, tables_dir, chunksize=None):
+    """Read and validate a single table; returns ``(path, errors, n_rows)``.
+
+    Top-level so it can be dispatched to worker processes; the lru_cache'd
+    reference-table and allowed-file loaders warm up per worker.
+    """
+    if chunksize:
+        errors, n_rows = validate_dataframe_streaming(
+            path, schema, tables_dir=tables_dir, chunksize=chunksize
+        )
+    else:
+        df = read_table(path)
+        errors = validate_dataframe(df, schema, tables_dir=tables_dir)
+        n_rows = len(df)
+    return path, errors, n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="candidate table file or folder of tables")
+    parser.add_argument("--tables-dir", default=".", help="directory holding the current tables")
+    parser.add_argument("--schemas-dir", default="schemas", help="directory holding the YAML schemas")
+    parser.add_argument("--archive-dir", default="archive", help="directory to archive replaced tables into")
+    parser.add_argument("--log-file", default="updates.log", help="update log to append to")
+    parser.add_argument("--check-only", action="store_true", help="validate without archiving or replacing")
+    parser.add_argument(
+        "--chunksize", type=int, default=None, metavar="N",
+        help="validate CSV/TSV files N rows at a time to bound memory use",
+    )
+    parser.add_argument(
+        "--fail-fast", action="store_true",
+        help="stop at the first failing table instead of validating the rest",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"input path does not exist: {args.input}")
+
+    schemas = load_schemas(args.schemas_dir)
+    schemas_by_prefix = build_schema_prefix_map(schemas)
+    if os.path.isdir(args.input):
+        files = _drop_shadowed_excel(sorted(list_candidate_files(args.input)))
+    else:
+        files = [args.input]
+    if not files:
+        print("No candidate tables found")
+        return 1
+
+    failures = 0
+    validated = []
+    jobs = []
+    for f in files:
+        schema = find_schema_for_file(schemas_by_prefix, f)
+        if schema is None:
+            print(f"No schema found for {Path(f).name}")
+            failures += 1
+            continue
+        jobs.append((f, schema))
+
+    # validating independent files is embarrassingly parallel
+    results = []
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as ex:
+            futures = [
+                ex.submit(_validate_one, f, schema, args.tables_dir, args.chunksize)
+                for f, schema in jobs
+            ]
+            for fut in futures:
+                result = fut.result()
+                results.append(result)
+                if args.fail_fast and result[1]:
+                    ex.shutdown(cancel_futures=True)
+                    break
+    else:
+        for f, schema in jobs:
+            result = _validate_one(f, schema, args.tables_dir, args.chunksize)
+            results.append(result)
+            if args.fail_fast and result[1]:
+                break
+
+    skipped = len(jobs) - len(results)
+    for (f, schema), (_path, errors, n_rows) in zip(jobs, results):
+        if errors:
+            failures += 1
+            print(f"FAIL {f}")
+            for err in errors:
+                print(f"  - {err}")
+        else:
+            print(f"PASS {f}")
+            validated.append((f, schema, n_rows))
+
+    if skipped:
+        print(f"--fail-fast: skipped {skipped} remaining table(s)")
+    if failures:
+        print(f"{failures} table(s) failed validation; nothing was replaced")
+        return 1
+
+    if args.check_only:
+        return 0
+
+    log_entries = []
+    for f, schema, n_rows in validated:
+        target = Path(args.tables_dir) / Path(f).name
+        log_entries.append(archive_and_replace(f, target, args.archive_dir, new_rows=n_rows))
+        print(f"Replaced {target.name}")
+    append_log_entries(args.log_file, log_entries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())